@@ -1,25 +1,45 @@
 #=========================
 # J & I — Proposals & Invoices (Streamlit)
 # =========================
-import os, io, json, base64, textwrap, smtplib, pytz, re
+import os, io, json, base64, hashlib, textwrap, smtplib, tempfile, threading, pytz, re
 from datetime import datetime, timedelta
+from decimal import Decimal
 from email.message import EmailMessage
+from functools import lru_cache
 
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
 import streamlit as st
-from sqlalchemy import create_engine, text
+import streamlit.components.v1 as components
+from sqlalchemy import create_engine, text, bindparam
+from sqlalchemy.dialects.postgresql import JSONB
 from reportlab.lib.pagesizes import LETTER
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 from reportlab.lib.utils import ImageReader
-from streamlit_drawable_canvas import st_canvas
-from PIL import Image
+# Pillow and streamlit_drawable_canvas are imported lazily inside the
+# signature paths — most sessions never enable signature capture and
+# both pull in heavyweight modules at cold start.
 
 # =========================
 # Config + Branding
 # =========================
 st.set_page_config(page_title="J&I Proposals & Invoices", page_icon="🧾", layout="centered")
+
+@st.cache_data
+def _logo_bytes():
+    with open("logo.png", "rb") as f: return f.read()
+
+@st.cache_resource
+def _logo():
+    # Decoded once per process; ReportLab reuses the raster on every draw.
+    try: return ImageReader("logo.png")
+    except Exception: return None
+
 try:
-    st.image("logo.png", width=220)
+    st.image(_logo_bytes(), width=220)
 except:
     st.info("Tip: place a 'logo.png' next to app.py to show it in header + PDFs.")
 st.title("🧾 J & I — Proposals & Invoices")
@@ -37,7 +57,14 @@ if not DATABASE_URL:
     st.error("DATABASE_URL not set in Secrets.")
     st.stop()
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+@st.cache_resource
+def get_engine():
+    # A true per-process singleton: the pool (and its warm sockets) survives
+    # script reruns and hot reloads instead of being rebuilt.
+    return create_engine(DATABASE_URL, pool_pre_ping=True, query_cache_size=1200,
+                         pool_size=10, max_overflow=20, pool_recycle=1800, pool_timeout=10)
+
+engine = get_engine()
 
 # =========================
 # Database Init + Migration
@@ -61,7 +88,7 @@ def init_db():
               customer_id TEXT NOT NULL REFERENCES customers(id),
               project_name TEXT,
               project_location TEXT,
-              items_json TEXT DEFAULT '[]',
+              items_json JSONB DEFAULT '[]'::jsonb,
               notes TEXT,
               status TEXT DEFAULT 'open',
               created_at TIMESTAMPTZ DEFAULT NOW()
@@ -75,7 +102,7 @@ def init_db():
               customer_id TEXT NOT NULL REFERENCES customers(id),
               project_name TEXT,
               project_location TEXT,
-              items_json TEXT DEFAULT '[]',
+              items_json JSONB DEFAULT '[]'::jsonb,
               total NUMERIC DEFAULT 0,
               deposit NUMERIC DEFAULT 0,
               check_number TEXT,
@@ -84,18 +111,110 @@ def init_db():
               created_at TIMESTAMPTZ DEFAULT NOW()
             );
         """))
-init_db()
+        # Dashboards order by created_at; keep those top-N scans index-backed
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_invoices_created_at ON invoices(created_at DESC)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_proposals_status_created ON proposals(status, created_at DESC)"))
+
+# Bump when appending a migration step in migrate_db()
+SCHEMA_VERSION = 2
 
 def migrate_db():
     with engine.begin() as conn:
-        # Ensure internal_cost column exists
-        res = conn.execute(text("""
-            SELECT column_name FROM information_schema.columns
-            WHERE table_name='invoices' AND column_name='internal_cost'
-        """)).fetchone()
-        if not res:
-            conn.execute(text("ALTER TABLE invoices ADD COLUMN internal_cost NUMERIC DEFAULT 0"))
-migrate_db()
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_meta(version INT NOT NULL)"))
+        version = conn.execute(text("SELECT version FROM schema_meta")).scalar()
+        if version is None:
+            # Pre-versioning database: run every (idempotent) step once
+            conn.execute(text("INSERT INTO schema_meta(version) VALUES (0)"))
+            version = 0
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 1:
+            # v1: per-invoice internal cost tracking
+            conn.execute(text("ALTER TABLE invoices ADD COLUMN IF NOT EXISTS internal_cost NUMERIC DEFAULT 0"))
+        if version < 2:
+            # v2: legacy TEXT items_json -> JSONB so the driver (de)serializes
+            # items natively and the column becomes indexable
+            for tbl in ("proposals", "invoices"):
+                dtype = conn.execute(text("""
+                    SELECT data_type FROM information_schema.columns
+                    WHERE table_name=:t AND column_name='items_json'
+                """), {"t": tbl}).scalar()
+                if dtype == "text":
+                    # One ALTER TABLE with three actions = one round-trip
+                    conn.execute(text(f"""
+                        ALTER TABLE {tbl}
+                        ALTER COLUMN items_json DROP DEFAULT,
+                        ALTER COLUMN items_json TYPE JSONB USING items_json::jsonb,
+                        ALTER COLUMN items_json SET DEFAULT '[]'::jsonb
+                    """))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS invoices_items_gin ON invoices USING GIN (items_json)"))
+        conn.execute(text("UPDATE schema_meta SET version=:v"), {"v": SCHEMA_VERSION})
+
+@st.cache_resource
+def _ensure_schema():
+    # DDL is idempotent but still round-trips to Postgres; run it once per
+    # process instead of on every rerun.
+    init_db()
+    migrate_db()
+    return True
+_ensure_schema()
+
+# =========================
+# SQL statements (built once so SQLAlchemy's compiled-query cache
+# can key on the same objects across reruns)
+# =========================
+_SQL_MAX_PROPOSAL_NUM = text("SELECT COALESCE(MAX(number),0) FROM proposals")
+_SQL_MAX_INVOICE_NUM  = text("SELECT COALESCE(MAX(number),0) FROM invoices")
+_SQL_CUSTOMERS        = text("SELECT id, name, email FROM customers ORDER BY name")
+_SQL_CUSTOMER_CONTACT = text("SELECT email,name FROM customers WHERE id=:id")
+# Dashboard listings skip items_json/notes; those blobs are fetched per
+# proposal on demand via _SQL_PROPOSAL_DETAIL
+_SQL_OPEN_PROPOSALS      = text("""SELECT id, number, customer_id, project_name, project_location, status, created_at
+                                   FROM proposals WHERE status='open' ORDER BY created_at DESC
+                                   LIMIT :lim OFFSET :off""")
+_SQL_OPEN_PROPOSAL_COUNT = text("SELECT COUNT(*) FROM proposals WHERE status='open'")
+_SQL_CONVERTED_PROPOSALS = text("""SELECT id, number, customer_id, project_name, project_location, status, created_at
+                                   FROM proposals WHERE status='converted' ORDER BY created_at DESC""")
+_SQL_PROPOSAL_DETAIL     = text("SELECT items_json, notes FROM proposals WHERE id=:id")
+_SQL_RECENT_INVOICES = text("""
+    SELECT invoice_no,customer_id,project_name,project_location,items_json,total,deposit,check_number,paid,internal_cost,created_at
+    FROM invoices ORDER BY created_at DESC LIMIT 20
+""")
+_SQL_UPSERT_CUSTOMER = text("""
+    INSERT INTO customers(id,name,email,phone,address,city_state_zip)
+    VALUES(:id,:name,:email,:phone,:addr,:csz)
+    ON CONFLICT(id) DO UPDATE
+    SET name=:name, email=:email, phone=:phone, address=:addr, city_state_zip=:csz
+""")
+# items binds as JSONB so Python lists go straight to the driver — no
+# json.dumps on write, no json.loads on read
+_SQL_INSERT_PROPOSAL = text("""
+    INSERT INTO proposals (id, number, customer_id, project_name, project_location, items_json, notes, status)
+    VALUES (:id,:num,:cid,:pname,:ploc,:items,:notes,'open')
+""").bindparams(bindparam("items", type_=JSONB))
+_SQL_INSERT_INVOICE = text("""
+    INSERT INTO invoices (invoice_no,number,customer_id,project_name,project_location,
+                          items_json,total,deposit,check_number,paid)
+    VALUES (:inv,:n,:cid,:pname,:ploc,:items,:total,:dep,:chk,:paid)
+""").bindparams(bindparam("items", type_=JSONB))
+_SQL_UPDATE_INVOICE = text("""
+    UPDATE invoices
+    SET customer_id=:cid, project_name=:pname, project_location=:ploc,
+        items_json=:items, total=:total, deposit=:dep, check_number=:chk, paid=:paid
+    WHERE number=:n
+""").bindparams(bindparam("items", type_=JSONB))
+_SQL_INVOICE_EXISTS      = text("SELECT invoice_no FROM invoices WHERE number=:n")
+_SQL_YTD_TOTALS = text("""
+    SELECT COALESCE(SUM(total),0) AS total_sum,
+           COALESCE(SUM(internal_cost),0) AS cost_sum
+    FROM invoices
+    WHERE created_at >= :start AND created_at < :end
+""")
+_SQL_SET_PROPOSAL_STATUS = text("UPDATE proposals SET status=:status WHERE id=:id")
+# Convert flow: flip the status and read the items back in one round-trip
+_SQL_CONVERT_PROPOSAL    = text("UPDATE proposals SET status='converted' WHERE id=:id RETURNING items_json")
+_SQL_TOGGLE_PAID         = text("UPDATE invoices SET paid = NOT paid WHERE invoice_no=:id")
+_SQL_SET_INTERNAL_COST   = text("UPDATE invoices SET internal_cost=:c WHERE invoice_no=:id")
 
 # =========================
 # Helpers
@@ -105,7 +224,6 @@ def now_ct(): return datetime.now(CT)
 
 ss = st.session_state
 # shared state
-ss.setdefault("line_count", 5)
 ss.setdefault("p_nonce", 0)
 ss.setdefault("i_nonce", 0)
 ss.setdefault("project_name_value", "")
@@ -114,8 +232,8 @@ ss.setdefault("prefill_items", [])
 ss.setdefault("prefill_customer_id", None)
 ss.setdefault("prefill_proposal_number", None)
 ss.setdefault("prefill_proposal_id", None)
-
-def add_line(): ss.line_count += 1
+ss.setdefault("p_pdf", None)
+ss.setdefault("i_pdf", None)
 
 def reset_proposal_form():
     ss.project_name_value = ""
@@ -124,7 +242,7 @@ def reset_proposal_form():
     ss.prefill_customer_id = None
     ss.prefill_proposal_number = None
     ss.prefill_proposal_id = None
-    ss.line_count = 5
+    ss.p_pdf = None
     ss.p_nonce += 1
     st.rerun()
 
@@ -135,31 +253,127 @@ def reset_invoice_form():
     ss.prefill_customer_id = None
     ss.prefill_proposal_number = None
     ss.prefill_proposal_id = None
-    ss.line_count = 5
+    ss.i_pdf = None
     ss.i_nonce += 1
     st.rerun()
 
+# Shared st.data_editor setup for the line-item grids
+_ITEM_COLUMNS = ["Description", "Qty", "Unit Price"]
+_ITEM_COLUMN_CONFIG = {
+    "Description": st.column_config.TextColumn(width="large"),
+    "Qty": st.column_config.NumberColumn(min_value=0.0, step=1.0, format="%.2f"),
+    "Unit Price": st.column_config.NumberColumn(min_value=0.0, step=10.0, format="$%.2f"),
+}
+
+def blank_items_df(rows=5):
+    return pd.DataFrame([{"Description": "", "Qty": 1.0, "Unit Price": 0.0}] * rows)
+
+def items_from_editor(edited):
+    # Drop empty rows and coerce the NaN/None pandas leaves in fresh rows —
+    # NaN survives `or 0` and would blow up the cents math and JSONB insert
+    return [{"Description": d,
+             "Qty": 0.0 if pd.isna(q) else float(q),
+             "Unit Price": 0.0 if pd.isna(u) else float(u)}
+            for d, q, u in edited[_ITEM_COLUMNS].itertuples(index=False)
+            if isinstance(d, str) and d.strip()]
+
+def _qty_price(r):
+    # .get defaults so legacy/hand-edited rows missing a field read as 0
+    return r.get("Qty", 0), r.get("Unit Price", 0)
+
 def compute_subtotal(items):
-    return sum(float(r.get("Qty",0)) * float(r.get("Unit Price",0)) for r in items)
+    # Money math happens in integer cents and comes back as a Decimal, so
+    # totals never drift and NUMERIC columns get the value unconverted.
+    if len(items) > 16:
+        # Big proposals: one vectorized multiply-sum instead of N boxed floats
+        arr = np.array([_qty_price(r) for r in items], dtype=np.float64)
+        cents = int(np.rint(arr[:, 0] * arr[:, 1] * 100).sum())
+    else:
+        cents = sum(round(float(q) * float(p) * 100) for q, p in map(_qty_price, items))
+    return Decimal(cents).scaleb(-2)
 
 def _max_existing_number(conn):
-    r1 = conn.execute(text("SELECT COALESCE(MAX(number),0) FROM proposals")).scalar() or 0
-    r2 = conn.execute(text("SELECT COALESCE(MAX(number),0) FROM invoices")).scalar() or 0
+    r1 = conn.execute(_SQL_MAX_PROPOSAL_NUM).scalar() or 0
+    r2 = conn.execute(_SQL_MAX_INVOICE_NUM).scalar() or 0
     return max(r1, r2)
 
 def format_prop_id(n): return f"P-{n:04d}"
 def format_inv_id(n):  return f"INV-{n:04d}"
 def format_inv_from_proposal(n): return f"INV-P-{n:04d}"
 
+def items_from_db(val):
+    # jsonb rows arrive as Python lists; tolerate legacy text just in case
+    if isinstance(val, str): return json.loads(val or "[]")
+    return val or []
+
 def parse_numeric_number(inv_no: str) -> int:
     # Extract the last run of digits (works for INV-#### and INV-P-####)
     m = re.search(r"(\d+)$", inv_no or "")
     if not m: raise ValueError("Could not parse numeric invoice number.")
     return int(m.group(1))
 
+@st.cache_data(ttl=60, show_spinner=False)
+def load_customers():
+    with engine.begin() as conn:
+        return [dict(r) for r in conn.execute(_SQL_CUSTOMERS).mappings().all()]
+
+def load_proposal_detail(pid):
+    with engine.begin() as conn:
+        return conn.execute(_SQL_PROPOSAL_DETAIL,{"id":pid}).mappings().first()
+
+def save_customers(rows):
+    # Accepts a list of param dicts; SQLAlchemy folds them into one
+    # executemany round-trip however many rows are passed.
+    with engine.begin() as conn:
+        conn.execute(_SQL_UPSERT_CUSTOMER, rows)
+    load_customers.clear()
+
+PROPOSALS_PER_PAGE = 20
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_open_proposals(page=1):
+    # Paged so the dashboard only instantiates widgets for one screenful
+    with engine.begin() as conn:
+        count = conn.execute(_SQL_OPEN_PROPOSAL_COUNT).scalar() or 0
+        rows = conn.execute(_SQL_OPEN_PROPOSALS,
+                            {"lim": PROPOSALS_PER_PAGE, "off": (page - 1) * PROPOSALS_PER_PAGE}).mappings().all()
+        return count, [dict(r) for r in rows]
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_converted_proposals():
+    with engine.begin() as conn:
+        return [dict(r) for r in conn.execute(_SQL_CONVERTED_PROPOSALS).mappings().all()]
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_recent_invoices():
+    with engine.begin() as conn:
+        return [dict(r) for r in conn.execute(_SQL_RECENT_INVOICES).mappings().all()]
+
+def session_memo(key, builder):
+    # Per-session memo for expensive per-card work (PDF bytes, etc.).
+    # The key must include everything the cached value depends on, so a
+    # row update naturally produces a fresh entry.
+    cache = ss.setdefault("_memo_cache", {})
+    if key not in cache:
+        if len(cache) > 64: cache.clear()
+        cache[key] = builder()
+    return cache[key]
+
 def show_pdf_newtab(pdf_bytes: bytes, label: str="📄 Open PDF in New Tab"):
-    b64 = base64.b64encode(pdf_bytes).decode("utf-8")
-    st.markdown(f'<a href="data:application/pdf;base64,{b64}" target="_blank">{label}</a>', unsafe_allow_html=True)
+    # A data: URL keeps the full base64 payload inside the page href and gets
+    # re-parsed by the browser on every click; a blob URL decodes it once on
+    # the client and hands the tab a real object URL.
+    b64 = base64.b64encode(pdf_bytes).decode("ascii")
+    components.html(
+        f'<a id="open" target="_blank" style="font-family:sans-serif">{label}</a>'
+        '<script>'
+        f'const raw=atob("{b64}");'
+        'const arr=Uint8Array.from(raw,c=>c.charCodeAt(0));'
+        'document.getElementById("open").href='
+        'URL.createObjectURL(new Blob([arr],{type:"application/pdf"}));'
+        '</script>',
+        height=30,
+    )
 
 # =========================
 # Email
@@ -183,36 +397,109 @@ def build_email_body(cust_name, is_proposal, ref_no):
     </p>
     """
 
-def send_email(pdf_bytes,to_email,subject,html_body,filename):
-    if not to_email: raise RuntimeError("Missing recipient email.")
+@st.cache_resource
+def _mail_pool():
+    return ThreadPoolExecutor(max_workers=2)
+
+def _build_message(pdf_bytes,to_email,subject,html_body,filename):
+    # to_email may be a single address or a list of them
+    recipients=[to_email] if isinstance(to_email,str) else [r for r in (to_email or []) if r]
+    if not recipients: raise RuntimeError("Missing recipient email.")
     msg=EmailMessage()
-    msg["From"],msg["To"],msg["Subject"]=FROM_EMAIL,to_email,subject
+    msg["From"],msg["To"],msg["Subject"]=FROM_EMAIL,", ".join(recipients),subject
     msg.add_alternative(html_body,subtype="html")
     msg.add_attachment(pdf_bytes,maintype="application",subtype="pdf",filename=filename)
-    with smtplib.SMTP_SSL(SMTP_SERVER,SMTP_PORT) as server:
-        server.login(FROM_EMAIL,APP_PASSWORD)
-        server.send_message(msg)
+    # serialize (base64-encode the PDF) once, not per recipient
+    return recipients,msg.as_bytes()
+
+@st.cache_resource
+def _smtp():
+    server=smtplib.SMTP_SSL(SMTP_SERVER,SMTP_PORT)
+    server.login(FROM_EMAIL,APP_PASSWORD)
+    return server
+
+# smtplib is not thread-safe and the cached connection is shared across
+# every session, so deliveries are serialized on one lock.
+_SMTP_LOCK=threading.Lock()
+
+def _deliver(recipients,raw):
+    # Probe the cached connection with a NOOP first so a dead socket is
+    # detected (and rebuilt once) before the message is on the wire,
+    # instead of mid-send where a retry could double-deliver.
+    with _SMTP_LOCK:
+        server=_smtp()
+        try:
+            server.noop()
+        except (smtplib.SMTPServerDisconnected,OSError):
+            try: server.close()
+            except Exception: pass
+            _smtp.clear()
+            server=_smtp()
+        server.sendmail(FROM_EMAIL,recipients,raw)
+
+def send_email(pdf_bytes,to_email,subject,html_body,filename):
+    # Build (and validate the recipient) on the script thread, then hand
+    # the TLS handshake + upload to the pool so the UI doesn't freeze.
+    recipients,raw=_build_message(pdf_bytes,to_email,subject,html_body,filename)
+    fut=_mail_pool().submit(_deliver,recipients,raw)
+    ss.setdefault("email_futures",[]).append((subject,fut))
+    st.toast(f"Sending — {subject}…")
+
+def show_email_status():
+    pending=[]
+    for subject,fut in ss.get("email_futures",[]):
+        if fut.done():
+            err=fut.exception()
+            if err: st.error(f"Email failed — {subject}: {err}")
+            else: st.success(f"Email sent — {subject}")
+        else:
+            st.info(f"Sending — {subject}…"); pending.append((subject,fut))
+    ss.email_futures=pending
 
 # =========================
 # PDF Builder
 # =========================
-def build_pdf(ref_no,cust_name,project_name,project_location,items,
-              subtotal,deposit,grand_total,check_number,
-              show_paid=False,notes=None,is_proposal=False,
-              signature_png_bytes=None,signature_date_text=None):
-    buf=io.BytesIO()
-    c=canvas.Canvas(buf,pagesize=LETTER)
-    w,h=LETTER
+# One TextWrapper per width — textwrap.wrap() would build a fresh instance
+# on every cache miss
+_WRAPPERS = {}
+
+@lru_cache(maxsize=1024)
+def _wrap(s, width):
+    # Descriptions repeat across line items, reruns and invoices; cache the
+    # pure-Python wrap so each (text, width) pair is tokenized once.
+    wrapper = _WRAPPERS.get(width)
+    if wrapper is None:
+        wrapper = _WRAPPERS[width] = textwrap.TextWrapper(width=width)
+    return tuple(wrapper.wrap(s))
 
-    # header
-    try: c.drawImage(ImageReader("logo.png"),w-120,h-80,width=100,height=60,mask='auto')
-    except: pass
+def _draw_header(c, w, h):
+    # Static company block as a Form XObject: its operators are emitted
+    # once per document and each page just references the form.
+    c.beginForm("header")
+    logo=_logo()
+    if logo:
+        try: c.drawImage(logo,w-120,h-80,width=100,height=60,mask='auto')
+        except: pass
     c.setFont("Helvetica-Bold",16); c.drawString(1*inch,h-1*inch,"J & I Heating and Cooling")
     c.setFont("Helvetica",10)
     c.drawString(1*inch,h-1.25*inch,"2788 N. 48th Rd."); c.drawString(1*inch,h-1.45*inch,"Sandwich IL, 60548")
     c.drawString(1*inch,h-1.65*inch,"Phone (630) 849-0385"); c.drawString(1*inch,h-1.85*inch,"Insured and Bonded")
+    c.endForm()
+    c.doForm("header")
+
+def _build_pdf_impl(ref_no,cust_name,project_name,project_location,items,
+                    subtotal,deposit,grand_total,check_number,
+                    show_paid=False,notes=None,is_proposal=False,issue=None,
+                    signature_png_bytes=None,signature_date_text=None):
+    # Spooled buffer: small PDFs stay in RAM, big ones spill to disk
+    # instead of repeatedly reallocating a growing BytesIO.
+    buf=tempfile.SpooledTemporaryFile(max_size=1<<20,mode="w+b")
+    c=canvas.Canvas(buf,pagesize=LETTER,pageCompression=1)
+    w,h=LETTER
+
+    _draw_header(c, w, h)
 
-    issue=now_ct().date()
+    issue=issue or now_ct().date()
     heading="Proposal" if is_proposal else "Invoice"
     terms = f"Valid until: {(issue+timedelta(days=15)).strftime('%m/%d/%Y')}" if is_proposal else f"Due Date: {issue.strftime('%m/%d/%Y')}"
     c.setFont("Helvetica",12)
@@ -235,16 +522,23 @@ def build_pdf(ref_no,cust_name,project_name,project_location,items,
     c.drawString(5.4*inch,y,"Unit"); c.drawString(6.4*inch,y,"Line Total"); y-=16
     c.setFont("Helvetica",10)
 
-    for row in items:
-        desc=str(row.get("Description","")); wrapped=textwrap.wrap(desc,width=50)
-        for j,line in enumerate(wrapped):
-            c.drawString(1*inch,y,line)
-            if j==0:
-                qty=float(row.get("Qty",0)); unit=float(row.get("Unit Price",0))
-                c.drawString(4.4*inch,y,f"{qty:.2f}")
-                c.drawString(5.4*inch,y,f"${unit:,.2f}")
-                c.drawString(6.4*inch,y,f"${qty*unit:,.2f}")
-            y-=18
+    # One PDF text object per column: rows append lines instead of issuing
+    # four positioned drawString operators each.
+    cols=[c.beginText(x,y) for x in (1*inch,4.4*inch,5.4*inch,6.4*inch)]
+    for tx in cols: tx.setFont("Helvetica",10,leading=18)
+    desc_tx,qty_tx,unit_tx,total_tx=cols
+    # Rows arrive as (desc, qty, unit) tuples from the cache key — tuple
+    # unpacking beats three dict lookups per row in this hot loop.
+    for desc,qty,unit in items:
+        wrapped=_wrap(desc,50) or ("",)
+        qty_tx.textLine(f"{qty:.2f}")
+        unit_tx.textLine(f"${unit:,.2f}")
+        total_tx.textLine(f"${qty*unit:,.2f}")
+        for line in wrapped: desc_tx.textLine(line)
+        for _ in range(len(wrapped)-1):
+            qty_tx.textLine(""); unit_tx.textLine(""); total_tx.textLine("")
+        y-=18*len(wrapped)
+    for tx in cols: c.drawText(tx)
 
     y-=10; c.setFont("Helvetica-Bold",11)
     if is_proposal:
@@ -259,7 +553,7 @@ def build_pdf(ref_no,cust_name,project_name,project_location,items,
 
     if notes:
         y-=25; c.setFont("Helvetica-Oblique",9)
-        for ln in textwrap.wrap(notes,width=90): c.drawString(1*inch,y,ln); y-=14
+        for ln in _wrap(notes,90): c.drawString(1*inch,y,ln); y-=14
 
     y-=40
     if signature_png_bytes:
@@ -271,11 +565,71 @@ def build_pdf(ref_no,cust_name,project_name,project_location,items,
         c.drawString(1*inch,y,"X ____________________")
         c.drawString(4*inch,y,"Date: ______________")
 
-    c.save(); buf.seek(0); return buf.getvalue()
+    c.save(); buf.seek(0)
+    data=buf.read(); buf.close()
+    return data
+
+@st.cache_data(max_entries=64, show_spinner=False,
+               hash_funcs={bytes: lambda b: hashlib.blake2b(b, digest_size=8).digest()})
+def _build_pdf_cached(ref_no,cust_name,project_name,project_location,items_key,
+                      subtotal,deposit,grand_total,check_number,
+                      show_paid,notes,is_proposal,issue,
+                      signature_png_bytes,signature_date_text):
+    return _build_pdf_impl(ref_no,cust_name,project_name,project_location,items_key,
+                           subtotal,deposit,grand_total,check_number,
+                           show_paid=show_paid,notes=notes,is_proposal=is_proposal,issue=issue,
+                           signature_png_bytes=signature_png_bytes,
+                           signature_date_text=signature_date_text)
+
+def build_pdf(ref_no,cust_name,project_name,project_location,items,
+              subtotal,deposit,grand_total,check_number,
+              show_paid=False,notes=None,is_proposal=False,
+              signature_png_bytes=None,signature_date_text=None):
+    # Reruns fire on every widget interaction; identical inputs should not
+    # pay for a full ReportLab rebuild. Items become a tuple-of-tuples so
+    # the cache can hash them.
+    items_key=tuple((str(r.get("Description","")),float(r.get("Qty",0)),float(r.get("Unit Price",0)))
+                    for r in items)
+    # Today's date is part of the key so a cached document naturally expires
+    # when the issue/due dates it renders roll over.
+    return _build_pdf_cached(ref_no,cust_name,project_name,project_location,items_key,
+                             subtotal,deposit,grand_total,check_number,
+                             show_paid,notes,is_proposal,now_ct().date(),
+                             signature_png_bytes,signature_date_text)
+
+def _encode_signature(image_data):
+    """Crop the canvas to the inked area and emit a compact grayscale PNG.
+
+    The raw canvas is a full-size RGBA frame that PIL would otherwise save
+    unoptimized; cropping to the strokes and dropping color cuts the PNG
+    from hundreds of KB to a few KB. Returns None for a blank canvas.
+    Encodes are memoized per stroke state so reruns from unrelated widgets
+    don't re-run PNG compression on an unchanged signature.
+    """
+    arr = np.asarray(image_data).astype("uint8")
+    digest = hashlib.blake2b(arr.tobytes(), digest_size=8).digest()
+    cache = ss.setdefault("_sig_cache", {})
+    if digest in cache:
+        return cache[digest]
+    cache.clear()  # only the current stroke state is ever wanted again
+    cache[digest] = _encode_signature_impl(arr)
+    return cache[digest]
+
+def _encode_signature_impl(arr):
+    from PIL import Image
+    ink = arr[:, :, :3].min(axis=2) < 200  # dark strokes on the white background
+    ys, xs = np.where(ink)
+    if ys.size == 0:
+        return None
+    crop = arr[ys.min():ys.max() + 1, xs.min():xs.max() + 1, :3]
+    buf = io.BytesIO()
+    Image.fromarray(crop).convert("L").save(buf, format="PNG", optimize=True, compress_level=9)
+    return buf.getvalue()
 
 # =========================
 # Tabs
 # =========================
+show_email_status()
 prop_tab,inv_tab=st.tabs(["Proposal","Invoice"])
 
 # ====================================================
@@ -288,13 +642,14 @@ with prop_tab:
     mode = st.radio("Choose Option", ["Select Existing Customer", "➕ Add New Customer"], key=f"proposal_cust_mode")
     cust = {"id": None, "name": ""}
     if mode == "Select Existing Customer":
-        with engine.begin() as conn:
-            customers = conn.execute(text("SELECT * FROM customers ORDER BY name")).mappings().all()
+        customers = load_customers()
         cust_options = [{"id": None, "name": "-- Select Customer --"}] + customers
         cust = st.selectbox("Customer", cust_options, index=0,
                             format_func=lambda c: c["name"], key=f"proposal_cust_select")
         if not cust["id"]:
             st.warning("Please select a customer before saving.")
+        if st.button("🔄 Refresh customers", key="proposal_refresh_customers"):
+            load_customers.clear(); st.rerun()
     else:
         new_name = st.text_input("Full Name *", key=f"proposal_new_name")
         new_email = st.text_input("Email", key=f"proposal_new_email")
@@ -305,51 +660,64 @@ with prop_tab:
             if not new_name.strip():
                 st.error("Name is required.")
             else:
-                with engine.begin() as conn:
-                    conn.execute(text("""
-                        INSERT INTO customers(id,name,email,phone,address,city_state_zip)
-                        VALUES(:id,:name,:email,:phone,:addr,:csz)
-                        ON CONFLICT(id) DO UPDATE
-                        SET name=:name, email=:email, phone=:phone, address=:addr, city_state_zip=:csz
-                    """), dict(id=new_email or new_phone or new_name,
-                               name=new_name, email=new_email, phone=new_phone,
-                               addr=new_addr, csz=new_csz))
+                save_customers([dict(id=new_email or new_phone or new_name,
+                                     name=new_name, email=new_email, phone=new_phone,
+                                     addr=new_addr, csz=new_csz)])
                 st.success("✅ New customer added for proposals.")
                 cust = {"id": new_email or new_phone or new_name, "name": new_name}
 
     # Project info
     p_nonce = ss.p_nonce
-    project_name = st.text_input("Project Name", ss.project_name_value, key=f"p_project_name_{p_nonce}")
-    project_location = st.text_input("Project Location (Address)", ss.project_location_value, key=f"p_project_location_{p_nonce}")
-
-    # Line items
-    st.markdown("**Line Items**")
-    items = []
-    for i in range(ss.line_count):
-        c1,c2,c3,c4 = st.columns([5,1.5,2,2])
-        desc = c1.text_input(f"Description {i+1}", "", key=f"p_desc_{p_nonce}_{i}")
-        qty  = c2.number_input(f"Qty {i+1}", min_value=0.0, value=1.0, step=1.0, key=f"p_qty_{p_nonce}_{i}")
-        unit = c3.number_input(f"Unit Price {i+1}", min_value=0.0, value=0.0, step=10.0, key=f"p_unit_{p_nonce}_{i}")
-        c4.write(f"${qty*unit:,.2f}")
-        if desc.strip():
-            items.append({"Description": desc, "Qty": qty, "Unit Price": unit})
-    st.button("➕ Add Line Item", on_click=add_line, key=f"p_add_btn_{p_nonce}")
-
-    subtotal = compute_subtotal(items)
     default_notes = (
         "By signing, the signee agrees to remit a 50% deposit of the proposed total, with the remainging balance due upon project completion, "
         "acknowledging that additional work outside the defined scope will incur extra charges reflected on final invoice, "
         "and understands that all manufacturer details are outlined in the product owner’s manual."
     )
-    notes = st.text_area("Notes", default_notes, height=100, key=f"p_notes_{p_nonce}")
+    # One rerun per Update click instead of one per keystroke
+    with st.form(f"proposal_entry_{p_nonce}"):
+        project_name = st.text_input("Project Name", ss.project_name_value, key=f"p_project_name_{p_nonce}")
+        project_location = st.text_input("Project Location (Address)", ss.project_location_value, key=f"p_project_location_{p_nonce}")
+
+        # Line items — one grid widget instead of 3 inputs per row; rows are
+        # added in the grid itself, so edits cost one state diff per submit
+        st.markdown("**Line Items**")
+        edited = st.data_editor(blank_items_df(), num_rows="dynamic", hide_index=True,
+                                use_container_width=True, column_config=_ITEM_COLUMN_CONFIG,
+                                key=f"p_items_{p_nonce}")
+        items = items_from_editor(edited)
+
+        notes = st.text_area("Notes", default_notes, height=100, key=f"p_notes_{p_nonce}")
+        fc1, fc2, fc3 = st.columns(3)
+        # Generate and Save submit the form too, so both always read what's
+        # on screen rather than the last Update Totals snapshot
+        p_updated = fc1.form_submit_button("✅ Update Totals")
+        p_gen = fc2.form_submit_button("🔄 Generate Proposal PDF")
+        p_save = fc3.form_submit_button("💾 Save Proposal")
+
+    subtotal = compute_subtotal(items)
+    if p_updated or p_save:
+        ss.p_pdf = None  # any previously generated PDF no longer matches the form
 
     with engine.begin() as conn:
         next_n = _max_existing_number(conn) + 1
 
+    if p_save:
+        if not cust.get("id"):
+            st.error("Select a customer before saving.")
+        else:
+            with engine.begin() as conn:
+                n=_max_existing_number(conn)+1; pid=format_prop_id(n)
+                conn.execute(_SQL_INSERT_PROPOSAL,
+                             dict(id=pid,num=n,cid=cust["id"],pname=project_name,ploc=project_location,
+                                  items=items,notes=notes))
+            load_open_proposals.clear()
+            st.success(f"✅ Proposal {pid} saved."); reset_proposal_form()
+
     # Signature toggle (optional)
     st.subheader("Signature (optional)")
     proposal_sig_bytes = None
     if st.toggle("Add In-Person Signature to Proposal", key=f"p_sig_toggle_{p_nonce}"):
+        from streamlit_drawable_canvas import st_canvas
         canvas_result = st_canvas(
             fill_color="rgba(255,255,255,0)",
             stroke_width=2, stroke_color="black",
@@ -358,55 +726,62 @@ with prop_tab:
             display_toolbar=True
         )
         if canvas_result.image_data is not None:
-            arr=(canvas_result.image_data[:,:,:3]*255).astype("uint8")
-            sig_img=Image.fromarray(arr); buf=io.BytesIO(); sig_img.save(buf,format="PNG")
-            proposal_sig_bytes=buf.getvalue()
-
-    pdf_prop = build_pdf(
-        ref_no=format_prop_id(next_n), cust_name=cust["name"] if cust and cust.get("id") else "",
-        project_name=project_name, project_location=project_location,
-        items=items, subtotal=subtotal, deposit=0, grand_total=subtotal, check_number=None,
-        show_paid=False, notes=notes, is_proposal=True,
-        signature_png_bytes=proposal_sig_bytes,
-        signature_date_text=now_ct().strftime("%m/%d/%Y") if proposal_sig_bytes else None
-    )
+            proposal_sig_bytes=_encode_signature(canvas_result.image_data)
+
+    # Build the PDF only when asked — typing in any widget no longer pays
+    # for a ReportLab render. (The signature widgets above sit outside the
+    # form but are regular widgets, so they're current on any rerun.)
+    if p_gen:
+        ss.p_pdf = build_pdf(
+            ref_no=format_prop_id(next_n), cust_name=cust["name"] if cust and cust.get("id") else "",
+            project_name=project_name, project_location=project_location,
+            items=items, subtotal=subtotal, deposit=0, grand_total=subtotal, check_number=None,
+            show_paid=False, notes=notes, is_proposal=True,
+            signature_png_bytes=proposal_sig_bytes,
+            signature_date_text=now_ct().strftime("%m/%d/%Y") if proposal_sig_bytes else None
+        )
+    pdf_prop = ss.p_pdf
+    if not pdf_prop:
+        st.caption("Generate the proposal PDF to enable Download / View / Email.")
 
-    cA,cB,cC,cD = st.columns(4)
-    with cA: st.download_button("📄 Download Proposal", data=pdf_prop, file_name=f"Proposal_{format_prop_id(next_n)}.pdf")
+    cA,cB,cC = st.columns(3)
+    with cA:
+        if pdf_prop: st.download_button("📄 Download Proposal", data=pdf_prop, file_name=f"Proposal_{format_prop_id(next_n)}.pdf")
     with cB:
-        if st.button("👀 View Proposal PDF"): show_pdf_newtab(pdf_prop,"📄 Open Proposal PDF")
+        if pdf_prop and st.button("👀 View Proposal PDF"): show_pdf_newtab(pdf_prop,"📄 Open Proposal PDF")
     with cC:
-        if st.button("📧 Email Proposal") and cust.get("id"):
+        if pdf_prop and st.button("📧 Email Proposal") and cust.get("id"):
             try:
                 with engine.begin() as conn:
-                    row=conn.execute(text("SELECT email FROM customers WHERE id=:id"),{"id":cust["id"]}).mappings().first()
+                    row=conn.execute(_SQL_CUSTOMER_CONTACT,{"id":cust["id"]}).mappings().first()
                 to_addr=(row["email"] if row and row.get("email") else None) or cust.get("email")
                 send_email(pdf_prop,to_addr,f"Proposal {format_prop_id(next_n)}",
                            build_email_body(cust["name"],True,format_prop_id(next_n)),
                            f"Proposal_{format_prop_id(next_n)}.pdf")
-                st.success("Proposal emailed.")
+                st.success("Proposal email queued.")
             except Exception as e: st.error(f"Email failed: {e}")
-    with cD:
-        if st.button("💾 Save Proposal") and cust.get("id"):
-            with engine.begin() as conn:
-                n=_max_existing_number(conn)+1; pid=format_prop_id(n)
-                conn.execute(text("""
-                    INSERT INTO proposals (id, number, customer_id, project_name, project_location, items_json, notes, status)
-                    VALUES (:id,:num,:cid,:pname,:ploc,:items,:notes,'open')
-                """),dict(id=pid,num=n,cid=cust["id"],pname=project_name,ploc=project_location,
-                          items=json.dumps(items),notes=notes))
-            st.success(f"✅ Proposal {pid} saved."); reset_proposal_form()
 
     if st.button("♻ Reset Proposal Form"): reset_proposal_form()
 
-    # Dashboard: Active Proposals
-    st.markdown("---"); st.subheader("📋 Active Proposals")
-    with engine.begin() as conn:
-        props=conn.execute(text("SELECT * FROM proposals WHERE status='open' ORDER BY created_at DESC")).mappings().all()
-    if not props: st.info("No open proposals.")
-    else:
-        with engine.begin() as conn:
-            cust_map={c["id"]:c["name"] for c in conn.execute(text("SELECT id,name FROM customers")).mappings().all()}
+    # Dashboard: Active Proposals — a fragment, so Convert/Close/View only
+    # rerun this block instead of the whole script
+    @st.fragment
+    def proposals_dashboard():
+        st.markdown("---"); st.subheader("📋 Active Proposals")
+        total_open,props=load_open_proposals(ss.get("props_page",1))
+        pages=max(1,-(-total_open//PROPOSALS_PER_PAGE))
+        # Converting/closing rows can shrink the page count below the stored
+        # selection; clamp before the widget renders (or disappears) so a
+        # stale page neither overflows max_value nor shows an empty list
+        if ss.get("props_page",1)>pages:
+            ss.props_page=pages
+            total_open,props=load_open_proposals(pages)
+        if pages>1:
+            st.number_input("Page",min_value=1,max_value=pages,key="props_page")
+        if not props:
+            st.info("No open proposals.")
+            return
+        cust_map={c["id"]:c["name"] for c in load_customers()}
         for prop in props:
             with st.expander(f"{prop['id']} — {prop.get('project_name') or ''}"):
                 st.write(f"Customer: {cust_map.get(prop['customer_id'], prop['customer_id'])}")
@@ -415,30 +790,33 @@ with prop_tab:
                 if c1.button("Convert to Invoice", key=f"conv_{prop['id']}"):
                     with engine.begin() as conn:
                         # create invoice with same number but labeled as from proposal
-                        exists=conn.execute(text("SELECT 1 FROM invoices WHERE number=:n"),{"n":prop["number"]}).fetchone()
+                        exists=conn.execute(_SQL_INVOICE_EXISTS,{"n":prop["number"]}).fetchone()
+                        detail=conn.execute(_SQL_CONVERT_PROPOSAL,{"id":prop["id"]}).mappings().first()
                         if not exists:
                             inv_no=format_inv_from_proposal(prop["number"])  # INV-P-#### ✅
-                            conn.execute(text("""
-                                INSERT INTO invoices (invoice_no,number,customer_id,project_name,project_location,
-                                                      items_json,total,deposit,check_number,paid)
-                                VALUES (:inv,:num,:cid,:pname,:ploc,:items,0,0,NULL,FALSE)
-                            """),dict(inv=inv_no,num=prop["number"],cid=prop["customer_id"],
-                                      pname=prop.get("project_name"),ploc=prop.get("project_location"),
-                                      items=prop["items_json"]))
-                        conn.execute(text("UPDATE proposals SET status='converted' WHERE id=:id"),{"id":prop["id"]})
+                            conn.execute(_SQL_INSERT_INVOICE,
+                                         dict(inv=inv_no,n=prop["number"],cid=prop["customer_id"],
+                                              pname=prop.get("project_name"),ploc=prop.get("project_location"),
+                                              items=items_from_db(detail["items_json"]) if detail else [],
+                                              total=0,dep=0,chk=None,paid=False))
+                    load_open_proposals.clear(); load_converted_proposals.clear(); load_recent_invoices.clear()
                     st.success(f"Converted {prop['id']} → {format_inv_from_proposal(prop['number'])}. See it in the Invoice tab (Converted Proposals).")
-                    st.rerun()
+                    st.rerun(scope="fragment")
                 if c2.button("Close Proposal", key=f"close_{prop['id']}"):
-                    with engine.begin() as conn: conn.execute(text("UPDATE proposals SET status='closed' WHERE id=:id"),{"id":prop["id"]})
-                    st.warning(f"Proposal {prop['id']} closed."); st.rerun()
+                    with engine.begin() as conn: conn.execute(_SQL_SET_PROPOSAL_STATUS,{"status":"closed","id":prop["id"]})
+                    load_open_proposals.clear()
+                    st.warning(f"Proposal {prop['id']} closed."); st.rerun(scope="fragment")
                 if c3.button("View PDF", key=f"view_{prop['id']}"):
-                    prop_items=json.loads(prop["items_json"] or "[]"); prop_subtotal=compute_subtotal(prop_items)
+                    detail=load_proposal_detail(prop["id"]) or {}
+                    prop_items=items_from_db(detail.get("items_json")); prop_subtotal=compute_subtotal(prop_items)
                     prop_pdf=build_pdf(ref_no=prop["id"],cust_name=cust_map.get(prop["customer_id"],prop["customer_id"]),
                         project_name=prop.get("project_name"),project_location=prop.get("project_location"),
                         items=prop_items,subtotal=prop_subtotal,deposit=0,grand_total=prop_subtotal,
-                        check_number=None,is_proposal=True,notes=prop.get("notes"))
+                        check_number=None,is_proposal=True,notes=detail.get("notes"))
                     show_pdf_newtab(prop_pdf,"📄 Open Proposal PDF")
 
+    proposals_dashboard()
+
 # ====================================================
 # INVOICE TAB
 # ====================================================
@@ -449,7 +827,7 @@ with inv_tab:
     mode = st.radio("Choose Option", ["Select Existing Customer", "➕ Add New Customer"], key=f"invoice_cust_mode")
     cust={"id":None,"name":""}
     if mode=="Select Existing Customer":
-        with engine.begin() as conn: customers=conn.execute(text("SELECT * FROM customers ORDER BY name")).mappings().all()
+        customers=load_customers()
         cust_options=[{"id":None,"name":"-- Select Customer --"}]+customers
 
         # Auto-select customer if coming from "Load into Invoice Maker"
@@ -463,6 +841,8 @@ with inv_tab:
         cust=st.selectbox("Customer",cust_options,index=selected_index,format_func=lambda c:c["name"],key=f"invoice_cust_select")
         if not cust["id"]:
             st.warning("Please select a customer before saving.")
+        if st.button("🔄 Refresh customers", key="invoice_refresh_customers"):
+            load_customers.clear(); st.rerun()
     else:
         new_name=st.text_input("Full Name *",key=f"invoice_new_name")
         new_email=st.text_input("Email",key=f"invoice_new_email")
@@ -472,15 +852,9 @@ with inv_tab:
         if st.button("💾 Save New Customer (Invoice)",key=f"invoice_save_customer"):
             if not new_name.strip(): st.error("Name is required.")
             else:
-                with engine.begin() as conn:
-                    conn.execute(text("""
-                        INSERT INTO customers(id,name,email,phone,address,city_state_zip)
-                        VALUES(:id,:name,:email,:phone,:addr,:csz)
-                        ON CONFLICT(id) DO UPDATE
-                        SET name=:name,email=:email,phone=:phone,address=:addr,city_state_zip=:csz
-                    """),dict(id=new_email or new_phone or new_name,
-                              name=new_name,email=new_email,phone=new_phone,
-                              addr=new_addr,csz=new_csz))
+                save_customers([dict(id=new_email or new_phone or new_name,
+                                     name=new_name,email=new_email,phone=new_phone,
+                                     addr=new_addr,csz=new_csz)])
                 st.success("✅ New customer added for invoices."); cust={"id":new_email or new_phone or new_name,"name":new_name}
 
     # Invoice number defaults
@@ -492,102 +866,108 @@ with inv_tab:
         inv_no_default = format_inv_id(max_all+1)               # INV-#### normal auto-increment
 
     i_nonce=ss.i_nonce
-    inv_no=st.text_input("Invoice #",inv_no_default,key=f"i_inv_no_{i_nonce}")
+    # One rerun per Update click instead of one per keystroke
+    with st.form(f"invoice_entry_{i_nonce}"):
+        inv_no=st.text_input("Invoice #",inv_no_default,key=f"i_inv_no_{i_nonce}")
+
+        # Project info
+        project_name=st.text_input("Project Name",ss.project_name_value,key=f"i_project_name_{i_nonce}")
+        project_location=st.text_input("Project Location (Address)",ss.project_location_value,key=f"i_project_location_{i_nonce}")
+
+        # Line items
+        # Prefilled proposals seed the grid via the nonce-keyed editor; fresh
+        # invoices start from the blank template
+        st.markdown("**Line Items**")
+        seed_df=pd.DataFrame(ss.prefill_items)[_ITEM_COLUMNS] if ss.prefill_items else blank_items_df()
+        edited=st.data_editor(seed_df,num_rows="dynamic",hide_index=True,
+                              use_container_width=True,column_config=_ITEM_COLUMN_CONFIG,
+                              key=f"i_items_{i_nonce}")
+        items=items_from_editor(edited)
+
+        # Totals/payments
+        deposit=st.number_input("Deposit Amount",min_value=0.0,value=0.0,step=50.0,key=f"i_deposit_{i_nonce}")
+        chk_no=st.text_input("Check Number (if paying by check)","",key=f"i_checknum_{i_nonce}")
+        show_paid=st.toggle("Show PAID Stamp",value=False,key=f"i_paid_toggle_{i_nonce}")
+        fc1,fc2,fc3=st.columns(3)
+        # Generate and Save submit the form too, so both always read what's
+        # on screen rather than the last Update Totals snapshot
+        i_updated=fc1.form_submit_button("✅ Update Totals")
+        i_gen=fc2.form_submit_button("🔄 Generate Invoice PDF")
+        i_save=fc3.form_submit_button("💾 Save Invoice")
 
-    # Project info
-    project_name=st.text_input("Project Name",ss.project_name_value,key=f"i_project_name_{i_nonce}")
-    project_location=st.text_input("Project Location (Address)",ss.project_location_value,key=f"i_project_location_{i_nonce}")
-
-    # Line items
-    st.markdown("**Line Items**"); items=[]; prefill=ss.prefill_items or []
-    needed=max(len(prefill),ss.line_count)
-    for i in range(needed):
-        d=(prefill[i]["Description"] if i<len(prefill) else ""); q=(float(prefill[i]["Qty"]) if i<len(prefill) else 1.0)
-        u=(float(prefill[i]["Unit Price"]) if i<len(prefill) else 0.0)
-        c1,c2,c3,c4=st.columns([5,1.5,2,2])
-        desc=c1.text_input(f"Description {i+1}",d,key=f"i_desc_{i_nonce}_{i}")
-        qty=c2.number_input(f"Qty {i+1}",min_value=0.0,value=q,step=1.0,key=f"i_qty_{i_nonce}_{i}")
-        unit=c3.number_input(f"Unit Price {i+1}",min_value=0.0,value=u,step=10.0,key=f"i_unit_{i_nonce}_{i}")
-        c4.write(f"${qty*unit:,.2f}")
-        if str(desc).strip(): items.append({"Description":desc,"Qty":qty,"Unit Price":unit})
-    st.button("➕ Add Line Item",on_click=add_line,key=f"i_add_btn_{i_nonce}")
-
-    # Totals/payments
     subtotal=compute_subtotal(items)
-    deposit=st.number_input("Deposit Amount",min_value=0.0,value=0.0,step=50.0,key=f"i_deposit_{i_nonce}")
-    chk_no=st.text_input("Check Number (if paying by check)","",key=f"i_checknum_{i_nonce}")
-    show_paid=st.toggle("Show PAID Stamp",value=False,key=f"i_paid_toggle_{i_nonce}")
-    grand_total=max(0.0,subtotal-deposit); invoice_notes="Thank you for your business!"
+    grand_total=max(Decimal(0),subtotal-Decimal(str(deposit))); invoice_notes="Thank you for your business!"
+    if i_updated or i_save:
+        ss.i_pdf=None  # any previously generated PDF no longer matches the form
+
+    if i_save:
+        if not cust.get("id"):
+            st.error("Select a customer before saving.")
+        else:
+            try:
+                number_part = parse_numeric_number(inv_no)  # handles INV-#### and INV-P-####
+            except Exception:
+                st.error("Invoice # must look like INV-1001 or INV-P-1001")
+                st.stop()
+            with engine.begin() as conn:
+                existing=conn.execute(_SQL_INVOICE_EXISTS,{"n":number_part}).fetchone()
+                if existing:
+                    conn.execute(_SQL_UPDATE_INVOICE,
+                                 dict(cid=cust["id"],pname=project_name,ploc=project_location,
+                                      items=items,total=grand_total,dep=deposit,chk=chk_no,paid=show_paid,n=number_part))
+                else:
+                    conn.execute(_SQL_INSERT_INVOICE,
+                                 dict(inv=inv_no,n=number_part,cid=cust["id"],pname=project_name,ploc=project_location,
+                                      items=items,total=grand_total,dep=deposit,chk=chk_no,paid=show_paid))
+            load_recent_invoices.clear()
+            st.success(f"✅ Invoice {inv_no} saved.")
 
     # Signature toggle (optional)
     st.subheader("Signature (optional)")
     invoice_sig_bytes=None
     if st.toggle("Add In-Person Signature to Invoice",key=f"i_sig_toggle_{i_nonce}"):
+        from streamlit_drawable_canvas import st_canvas
         canvas_result=st_canvas(fill_color="rgba(255,255,255,0)",stroke_width=2,stroke_color="black",
             background_color="white",width=400,height=120,drawing_mode="freedraw",
             key=f"i_sig_canvas_{i_nonce}",display_toolbar=True)
         if canvas_result.image_data is not None:
-            arr=(canvas_result.image_data[:,:,:3]*255).astype("uint8")
-            sig_img=Image.fromarray(arr); buf=io.BytesIO(); sig_img.save(buf,format="PNG")
-            invoice_sig_bytes=buf.getvalue()
-
-    pdf_inv=build_pdf(ref_no=inv_no,cust_name=cust["name"] if cust and cust.get("id") else "",
-        project_name=project_name,project_location=project_location,
-        items=items,subtotal=subtotal,deposit=deposit,grand_total=grand_total,check_number=chk_no,
-        show_paid=show_paid,notes=invoice_notes,is_proposal=False,
-        signature_png_bytes=invoice_sig_bytes,
-        signature_date_text=now_ct().strftime("%m/%d/%Y") if invoice_sig_bytes else None)
-
-    cA,cB,cC,cD=st.columns(4)
-    with cA: st.download_button("📄 Download Invoice",data=pdf_inv,file_name=f"Invoice_{inv_no}.pdf")
+            invoice_sig_bytes=_encode_signature(canvas_result.image_data)
+
+    # (The signature widgets above sit outside the form but are regular
+    # widgets, so they're current on any rerun.)
+    if i_gen:
+        ss.i_pdf=build_pdf(ref_no=inv_no,cust_name=cust["name"] if cust and cust.get("id") else "",
+            project_name=project_name,project_location=project_location,
+            items=items,subtotal=subtotal,deposit=deposit,grand_total=grand_total,check_number=chk_no,
+            show_paid=show_paid,notes=invoice_notes,is_proposal=False,
+            signature_png_bytes=invoice_sig_bytes,
+            signature_date_text=now_ct().strftime("%m/%d/%Y") if invoice_sig_bytes else None)
+    pdf_inv=ss.i_pdf
+    if not pdf_inv:
+        st.caption("Generate the invoice PDF to enable Download / View / Email.")
+
+    cA,cB,cC=st.columns(3)
+    with cA:
+        if pdf_inv: st.download_button("📄 Download Invoice",data=pdf_inv,file_name=f"Invoice_{inv_no}.pdf")
     with cB:
-        if st.button("👀 View Invoice PDF"): show_pdf_newtab(pdf_inv,"📄 Open Invoice PDF")
+        if pdf_inv and st.button("👀 View Invoice PDF"): show_pdf_newtab(pdf_inv,"📄 Open Invoice PDF")
     with cC:
-        if st.button("📧 Email Invoice") and cust.get("id"):
+        if pdf_inv and st.button("📧 Email Invoice") and cust.get("id"):
             try:
                 with engine.begin() as conn:
-                    row=conn.execute(text("SELECT email,name FROM customers WHERE id=:id"),{"id":cust["id"]}).mappings().first()
+                    row=conn.execute(_SQL_CUSTOMER_CONTACT,{"id":cust["id"]}).mappings().first()
                 to_addr=(row["email"] if row and row.get("email") else None) or cust.get("email")
                 name_for_email=(row["name"] if row and row.get("name") else cust.get("name") or "")
                 send_email(pdf_inv,to_addr,f"Invoice {inv_no}",build_email_body(name_for_email,False,inv_no),f"Invoice_{inv_no}.pdf")
-                st.success("Invoice emailed.")
+                st.success("Invoice email queued.")
             except Exception as e: st.error(f"Email failed: {e}")
-    with cD:
-        if st.button("💾 Save Invoice") and cust.get("id"):
-            try:
-                number_part = parse_numeric_number(inv_no)  # handles INV-#### and INV-P-####
-            except Exception:
-                st.error("Invoice # must look like INV-1001 or INV-P-1001")
-                st.stop()
-            with engine.begin() as conn:
-                existing=conn.execute(text("SELECT invoice_no FROM invoices WHERE number=:n"),{"n":number_part}).fetchone()
-                if existing:
-                    conn.execute(text("""
-                        UPDATE invoices
-                        SET customer_id=:cid, project_name=:pname, project_location=:ploc,
-                            items_json=:items, total=:total, deposit=:dep, check_number=:chk, paid=:paid
-                        WHERE number=:n
-                    """),dict(cid=cust["id"],pname=project_name,ploc=project_location,
-                              items=json.dumps(items),total=grand_total,dep=deposit,chk=chk_no,paid=show_paid,n=number_part))
-                else:
-                    conn.execute(text("""
-                        INSERT INTO invoices (invoice_no,number,customer_id,project_name,project_location,
-                                              items_json,total,deposit,check_number,paid)
-                        VALUES (:inv,:n,:cid,:pname,:ploc,:items,:total,:dep,:chk,:paid)
-                    """),dict(inv=inv_no,n=number_part,cid=cust["id"],pname=project_name,ploc=project_location,
-                              items=json.dumps(items),total=grand_total,dep=deposit,chk=chk_no,paid=show_paid))
-            st.success(f"✅ Invoice {inv_no} saved.")
 
     if st.button("♻ Reset Invoice Form"): reset_invoice_form()
 
     # Dashboard: Recent Invoices
     st.markdown("---"); st.subheader("🧾 Recent Invoices")
-    with engine.begin() as conn:
-        invs=conn.execute(text("""
-            SELECT invoice_no,customer_id,project_name,project_location,items_json,total,deposit,check_number,paid,internal_cost,created_at
-            FROM invoices ORDER BY created_at DESC LIMIT 20
-        """)).mappings().all()
-        cust_map={c["id"]:c["name"] for c in conn.execute(text("SELECT id,name FROM customers")).mappings().all()}
+    invs=load_recent_invoices()
+    cust_map={c["id"]:c["name"] for c in load_customers()}
     if not invs: st.info("No invoices yet.")
     else:
         for inv in invs:
@@ -597,10 +977,11 @@ with inv_tab:
                 st.write(f"Paid: {'✅' if inv['paid'] else '❌'}")
                 c1,c2,c3=st.columns(3)
                 if c1.button("Mark Paid / Unpaid",key=f"toggle_{inv['invoice_no']}"):
-                    with engine.begin() as conn: conn.execute(text("UPDATE invoices SET paid = NOT paid WHERE invoice_no=:id"),{"id":inv["invoice_no"]})
+                    with engine.begin() as conn: conn.execute(_SQL_TOGGLE_PAID,{"id":inv["invoice_no"]})
+                    load_recent_invoices.clear()  # drop only the stale list; other caches survive the rerun
                     st.rerun()
                 if c2.button("View PDF",key=f"view_{inv['invoice_no']}"):
-                    items_pdf=json.loads(inv["items_json"] or "[]"); subtotal_pdf=compute_subtotal(items_pdf)
+                    items_pdf=items_from_db(inv["items_json"]); subtotal_pdf=compute_subtotal(items_pdf)
                     pdf=build_pdf(ref_no=inv["invoice_no"],cust_name=cust_map.get(inv["customer_id"],inv["customer_id"]),
                         project_name=inv.get("project_name"),project_location=inv.get("project_location"),
                         items=items_pdf,subtotal=subtotal_pdf,deposit=inv.get("deposit") or 0,
@@ -610,23 +991,30 @@ with inv_tab:
                 # Internal cost entry
                 cost_val=st.number_input("Internal Cost (not shown to customer)",min_value=0.0,value=float(inv.get("internal_cost") or 0),step=50.0,key=f"cost_{inv['invoice_no']}")
                 if st.button("💾 Save Cost",key=f"savecost_{inv['invoice_no']}"):
-                    with engine.begin() as conn: conn.execute(text("UPDATE invoices SET internal_cost=:c WHERE invoice_no=:id"),{"c":cost_val,"id":inv["invoice_no"]})
+                    with engine.begin() as conn: conn.execute(_SQL_SET_INTERNAL_COST,{"c":cost_val,"id":inv["invoice_no"]})
+                    load_recent_invoices.clear()
                     st.success("Internal cost saved."); st.rerun()
-                # Download PDF
-                st.download_button("⬇️ Download PDF",data=build_pdf(
-                    ref_no=inv["invoice_no"],cust_name=cust_map.get(inv["customer_id"],inv["customer_id"]),
-                    project_name=inv.get("project_name"),project_location=inv.get("project_location"),
-                    items=json.loads(inv["items_json"] or "[]"),subtotal=compute_subtotal(json.loads(inv["items_json"] or "[]")),
-                    deposit=inv.get("deposit") or 0,grand_total=inv.get("total") or 0,
-                    check_number=inv.get("check_number"),show_paid=bool(inv.get("paid")),
-                    notes="Thank you for your business!",is_proposal=False),
+                # Download PDF — memoized per session so unrelated reruns
+                # don't rebuild every card's PDF
+                def _card_pdf(inv=inv):
+                    items_dl=items_from_db(inv["items_json"])
+                    return build_pdf(
+                        ref_no=inv["invoice_no"],cust_name=cust_map.get(inv["customer_id"],inv["customer_id"]),
+                        project_name=inv.get("project_name"),project_location=inv.get("project_location"),
+                        items=items_dl,subtotal=compute_subtotal(items_dl),
+                        deposit=inv.get("deposit") or 0,grand_total=inv.get("total") or 0,
+                        check_number=inv.get("check_number"),show_paid=bool(inv.get("paid")),
+                        notes="Thank you for your business!",is_proposal=False)
+                memo_key=("inv_card_pdf",inv["invoice_no"],str(inv["total"]),str(inv["deposit"]),
+                          inv.get("check_number"),bool(inv.get("paid")),str(inv["items_json"]),
+                          inv.get("project_name"),inv.get("project_location"),inv["customer_id"])
+                st.download_button("⬇️ Download PDF",data=session_memo(memo_key,_card_pdf),
                     file_name=f"{inv['invoice_no']}.pdf",key=f"dl_{inv['invoice_no']}")
 
     # Dashboard: Converted Proposals
     st.markdown("---"); st.subheader("📑 Converted Proposals")
-    with engine.begin() as conn:
-        converted_props=conn.execute(text("SELECT * FROM proposals WHERE status='converted' ORDER BY created_at DESC")).mappings().all()
-        cust_map2={c["id"]:c["name"] for c in conn.execute(text("SELECT id,name FROM customers")).mappings().all()}
+    converted_props=load_converted_proposals()
+    cust_map2={c["id"]:c["name"] for c in load_customers()}
     if not converted_props: st.info("No converted proposals yet.")
     else:
         for prop in converted_props:
@@ -637,7 +1025,8 @@ with inv_tab:
                 if c1.button("Load into Invoice Maker",key=f"load_{prop['id']}"):
                     # Prefill EVERYTHING, including the customer id
                     ss.prefill_customer_id=prop["customer_id"]
-                    ss.prefill_items=json.loads(prop["items_json"] or "[]")
+                    detail=load_proposal_detail(prop["id"]) or {}
+                    ss.prefill_items=items_from_db(detail.get("items_json"))
                     ss.project_name_value=prop.get("project_name") or ""
                     ss.project_location_value=prop.get("project_location") or ""
                     ss.prefill_proposal_number=prop["number"]   # makes default inv no = INV-P-####
@@ -646,11 +1035,12 @@ with inv_tab:
                     st.success(f"Proposal {prop['id']} loaded above with customer selected.")
                     st.rerun()
                 if c2.button("View Proposal PDF",key=f"view_conv_{prop['id']}"):
-                    prop_items=json.loads(prop["items_json"] or "[]"); prop_subtotal=compute_subtotal(prop_items)
+                    detail=load_proposal_detail(prop["id"]) or {}
+                    prop_items=items_from_db(detail.get("items_json")); prop_subtotal=compute_subtotal(prop_items)
                     prop_pdf=build_pdf(ref_no=prop["id"],cust_name=cust_map2.get(prop["customer_id"],prop["customer_id"]),
                         project_name=prop.get("project_name"),project_location=prop.get("project_location"),
                         items=prop_items,subtotal=prop_subtotal,deposit=0,grand_total=prop_subtotal,
-                        check_number=None,is_proposal=True,notes=prop.get("notes"))
+                        check_number=None,is_proposal=True,notes=detail.get("notes"))
                     show_pdf_newtab(prop_pdf,"📄 Open Proposal PDF")
 
     # =========================
@@ -662,12 +1052,7 @@ with inv_tab:
         start = datetime(year, 1, 1, tzinfo=CT)
         end   = datetime(year+1, 1, 1, tzinfo=CT)
         with engine.begin() as conn:
-            totals = conn.execute(text("""
-                SELECT COALESCE(SUM(total),0) AS total_sum,
-                       COALESCE(SUM(internal_cost),0) AS cost_sum
-                FROM invoices
-                WHERE created_at >= :start AND created_at < :end
-            """), {"start": start, "end": end}).mappings().first()
+            totals = conn.execute(_SQL_YTD_TOTALS, {"start": start, "end": end}).mappings().first()
         total_sum = float(totals["total_sum"] or 0)
         cost_sum  = float(totals["cost_sum"] or 0)
         profit    = total_sum - cost_sum